@@ -3,28 +3,53 @@
 OBS Prayer Time Auto-Switcher
 Scrapes iqama times from The Masjid App and automatically switches OBS scenes.
 
+Iqama times are read from the server-rendered slides HTML, falling back to
+headless Chromium if the page turns out to be client-rendered. A direct JSON
+API path exists but is inactive: no Masjid App endpoint has been captured and
+its schema is unverified, so it only runs once MASJID_API_URL is set.
+
 Default scene: "The Masjid App View"
 At iqama time: switches to "PTZ Camera & Masjid App" for 10 minutes, then back.
 On Fridays: switches to "PTZ Camera & Masjid App" at 1:25 PM, back at 2:15 PM.
 
 Requirements:
-    pip install obsws-python playwright apscheduler python-dotenv
-    playwright install chromium
+    pip install obsws-python requests requests-cache apscheduler sqlalchemy
+    pip install python-dotenv                              # optional, loads .env
+    pip install selectolax                                 # parses the slides page HTML
+    pip install msgspec                                    # optional, faster MASJID_API_URL decoding
+    pip install playwright && playwright install chromium  # only for the browser fallback
 """
 
+import asyncio
+import functools
+import hashlib
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import re
 import sys
+import threading
 import time
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 
 import obsws_python as obs
-from apscheduler.schedulers.blocking import BlockingScheduler
-from dotenv import load_dotenv
-from playwright.sync_api import sync_playwright
-
-load_dotenv()
+import requests
+from apscheduler.jobstores.base import JobLookupError
+from apscheduler.jobstores.memory import MemoryJobStore
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from obsws_python.error import OBSSDKRequestError
+from requests_cache import CachedSession
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    pass  # rely on the environment being populated already
+else:
+    load_dotenv()
 
 # ── Configuration ────────────────────────────────────────────────────────────
 
@@ -33,6 +58,12 @@ OBS_HOST = os.getenv("OBS_HOST", "localhost")
 OBS_PORT = int(os.getenv("OBS_PORT", "4455"))
 OBS_PASSWORD = os.getenv("OBS_PASSWORD", "")
 
+# Seconds to wait on any OBS request before treating the connection as dead
+OBS_TIMEOUT_SECONDS = 5
+
+# Seconds between keep-alive pings on the persistent OBS connection
+OBS_HEARTBEAT_SECONDS = 25
+
 # Scene names
 SCENE_DEFAULT = "The Masjid App View"
 SCENE_PRAYER = "PTZ Camera & Masjid App"
@@ -47,120 +78,409 @@ JUMUAH_END = "14:15"    # 2:15 PM
 # Masjid App URL to scrape iqama times
 MASJID_URL = "https://themasjidapp.org/601/slides"
 
+# Optional JSON endpoint serving the slide data, expected to look like
+# {"prayers": [{"name": "Fajr", "iqama": "6:15 AM"}, ...]}. No endpoint has been
+# confirmed for The Masjid App yet, so this is unset by default and the slides
+# page is scraped directly. Set MASJID_API_URL once one has been captured.
+MASJID_API_URL = os.getenv("MASJID_API_URL", "")
+
+# Where the HTTP cache and persisted job store live (next to this script, so
+# they survive being started from a different working directory)
+DATA_DIR = os.getenv("OBS_SWITCHER_DATA_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# How long a fetched API response is reused before hitting the masjid site again
+IQAMA_CACHE_TTL = timedelta(hours=1)
+
+# Render the slides page in headless Chromium if its HTML has no prayer cards.
+# Until MASJID_API_URL is set this is the only route for client-rendered pages,
+# so the browser is still part of the normal path there.
+USE_BROWSER_FALLBACK = True
+
 # Timezone
 TIMEZONE = ZoneInfo("America/New_York")  # Change if your masjid is in a different timezone
 
 # Prayer names to look for when scraping (in order)
-PRAYER_NAMES = ["Fajr", "Dhuhr", "Asr", "Maghrib", "Isha"]
+PRAYER_NAMES = ("Fajr", "Dhuhr", "Asr", "Maghrib", "Isha")
+_PRAYER_SET = frozenset(PRAYER_NAMES)
 
 # ── Logging ──────────────────────────────────────────────────────────────────
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler("obs_prayer_switcher.log"),
-    ],
+# Records are queued in memory and written to stdout/file by a background thread
+_log_formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+_stream_handler = logging.StreamHandler(sys.stdout)
+_file_handler = logging.FileHandler("obs_prayer_switcher.log")
+for _h in (_stream_handler, _file_handler):
+    _h.setFormatter(_log_formatter)
+
+_log_queue = queue.SimpleQueue()
+log_listener = logging.handlers.QueueListener(
+    _log_queue, _stream_handler, _file_handler, respect_handler_level=True
 )
+log_listener.start()
+
+_root_logger = logging.getLogger()
+_root_logger.setLevel(logging.INFO)
+_root_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
 log = logging.getLogger(__name__)
 
 # ── OBS Control ──────────────────────────────────────────────────────────────
 
-def switch_scene(scene_name: str):
-    """Connect to OBS and switch to the specified scene."""
+_OBS_CLIENT: obs.ReqClient | None = None
+_OBS_LOCK = threading.Lock()
+
+
+def _connect_obs() -> obs.ReqClient:
+    kwargs = {"host": OBS_HOST, "port": OBS_PORT, "timeout": OBS_TIMEOUT_SECONDS}
+    if OBS_PASSWORD:
+        kwargs["password"] = OBS_PASSWORD
+    return obs.ReqClient(**kwargs)
+
+
+def _drop_obs_client():
+    """Close and forget the persistent client so the next call reconnects. Caller holds _OBS_LOCK."""
+    global _OBS_CLIENT
+    if _OBS_CLIENT is None:
+        return
     try:
-        kwargs = {"host": OBS_HOST, "port": OBS_PORT}
-        if OBS_PASSWORD:
-            kwargs["password"] = OBS_PASSWORD
-        cl = obs.ReqClient(**kwargs)
-        cl.set_current_program_scene(scene_name)
-        log.info(f"✅ Switched to scene: {scene_name}")
-        cl.disconnect()
-    except Exception as e:
-        log.error(f"❌ Failed to switch scene: {e}")
+        _OBS_CLIENT.disconnect()
+    except Exception:
+        pass
+    _OBS_CLIENT = None
+
+
+def _blocking_switch(scene_name: str):
+    """Switch to the specified scene over the persistent OBS connection."""
+    global _OBS_CLIENT
+    with _OBS_LOCK:
+        for attempt in (1, 2):
+            try:
+                if _OBS_CLIENT is None:
+                    _OBS_CLIENT = _connect_obs()
+                _OBS_CLIENT.set_current_program_scene(scene_name)
+                log.info(f"✅ Switched to scene: {scene_name}")
+                return
+            except OBSSDKRequestError as e:
+                # OBS answered but refused the request (e.g. unknown scene) — the link is fine
+                log.error(f"❌ Failed to switch scene: {e}")
+                return
+            except Exception as e:
+                _drop_obs_client()
+                if attempt == 1:
+                    log.warning(f"⚠️  OBS connection lost ({e}), reconnecting...")
+                else:
+                    log.error(f"❌ Failed to switch scene: {e}")
+
+
+async def switch_scene(scene_name: str):
+    await asyncio.to_thread(_blocking_switch, scene_name)
+
+
+_OBS_HEARTBEAT_FAILURES = 0
 
 
-def switch_to_prayer():
+def _blocking_heartbeat():
+    """Ping OBS once; drop the client after two missed pings so the next switch reconnects."""
+    global _OBS_HEARTBEAT_FAILURES
+    with _OBS_LOCK:
+        if _OBS_CLIENT is None:
+            _OBS_HEARTBEAT_FAILURES = 0
+            return
+        try:
+            _OBS_CLIENT.get_version()
+            _OBS_HEARTBEAT_FAILURES = 0
+        except Exception as e:
+            _OBS_HEARTBEAT_FAILURES += 1
+            log.warning(f"⚠️  OBS heartbeat failed ({_OBS_HEARTBEAT_FAILURES}): {e}")
+            if _OBS_HEARTBEAT_FAILURES >= 2:
+                _drop_obs_client()
+                _OBS_HEARTBEAT_FAILURES = 0
+
+
+async def obs_heartbeat():
+    await asyncio.to_thread(_blocking_heartbeat)
+
+
+async def switch_to_prayer():
     """Switch to the prayer camera scene."""
     log.info("🕌 Iqama time — switching to prayer camera")
-    switch_scene(SCENE_PRAYER)
+    await switch_scene(SCENE_PRAYER)
 
 
-def switch_to_default():
+async def switch_to_default():
     """Switch back to the default Masjid App view."""
     log.info("📺 Switching back to Masjid App view")
-    switch_scene(SCENE_DEFAULT)
+    await switch_scene(SCENE_DEFAULT)
+
+
+async def prayer_window(minutes: int):
+    """Show the prayer camera for the given number of minutes, then switch back."""
+    await switch_to_prayer()
+    await asyncio.sleep(minutes * 60)
+    await switch_to_default()
 
 
 # ── Scraping ─────────────────────────────────────────────────────────────────
 
+SESSION = CachedSession(
+    os.path.join(DATA_DIR, "iqama_cache"), backend="sqlite", expire_after=IQAMA_CACHE_TTL
+)
+
+# Parsed iqama times from the last API response, reused while that response
+# is still being served from the HTTP cache on the same day
+_IQAMA_CACHE_DATE = None
+_IQAMA_CACHE = {}
+
+
+@functools.lru_cache(maxsize=1)
+def _slides_type():
+    """Build the msgspec schema for the API payload (msgspec is only needed with MASJID_API_URL)."""
+    import msgspec
+
+    class Prayer(msgspec.Struct):
+        name: str
+        iqama: str | None = None  # entries like Sunrise may have no iqama
+
+    class Slides(msgspec.Struct):
+        prayers: list[Prayer]
+
+    return Slides
+
+
+def _decode_prayers(content: bytes):
+    """Decode the API payload into (name, iqama) pairs, tolerating schema drift."""
+    try:
+        import msgspec
+    except ImportError:
+        pass  # fall through to the plain json walk
+    else:
+        try:
+            data = msgspec.json.decode(content, type=_slides_type())
+            return [(p.name, p.iqama) for p in data.prayers if p.iqama is not None]
+        except msgspec.DecodeError as e:
+            log.warning(f"⚠️  Iqama API response no longer matches the expected schema: {e}")
+
+    # Salvage whatever entries still carry a usable name and iqama string
+    pairs = []
+    for obj in json.loads(content).get("prayers", []):
+        if not isinstance(obj, dict):
+            continue
+        name, iqama = obj.get("name"), obj.get("iqama")
+        if isinstance(name, str) and isinstance(iqama, str):
+            pairs.append((name, iqama))
+    return pairs
+
+
+def _record_iqama(iqama_times, prayer_name, raw_time):
+    """Convert a scraped iqama time and store it if it belongs to a fard prayer."""
+    if prayer_name not in _PRAYER_SET:
+        log.info(f"  Skipping non-fard: {prayer_name}")
+        return
+
+    converted = convert_to_24h(raw_time)
+    if converted:
+        iqama_times[prayer_name] = converted
+        log.info(f"  Found {prayer_name} iqama: {raw_time} → {converted}")
+    else:
+        log.warning(f"  ⚠️  Could not parse time for {prayer_name}: {raw_time}")
+
+
+def _fetch_from_api():
+    """Fetch iqama times from MASJID_API_URL, reusing the parsed result on cache hits."""
+    global _IQAMA_CACHE_DATE, _IQAMA_CACHE
+
+    log.info(f"🔍 Fetching iqama times from {MASJID_API_URL}")
+    today = datetime.now(TIMEZONE).date()
+    iqama_times = {}
+
+    try:
+        resp = SESSION.get(MASJID_API_URL, timeout=10)
+        resp.raise_for_status()
+        if resp.from_cache and _IQAMA_CACHE_DATE == today and _IQAMA_CACHE:
+            log.info("  Using cached iqama times")
+            return dict(_IQAMA_CACHE)
+
+        for name, iqama in _decode_prayers(resp.content):
+            _record_iqama(iqama_times, name.strip(), iqama)
+    except Exception as e:
+        log.error(f"❌ Fetching iqama times failed: {e}")
+
+    if iqama_times:
+        _IQAMA_CACHE_DATE = today
+        _IQAMA_CACHE = dict(iqama_times)
+
+    return iqama_times
+
+
 def scrape_iqama_times():
+    iqama_times = {}
+
+    if MASJID_API_URL:
+        iqama_times = _fetch_from_api()
+        if not iqama_times:
+            log.warning("⚠️  API returned no iqama times, falling back to the slides page")
+
+    if not iqama_times:
+        iqama_times = _scrape_static_html()
+
+    if iqama_times is None and USE_BROWSER_FALLBACK:
+        log.warning("⚠️  Slides page is client-rendered, falling back to browser scrape")
+        iqama_times = _scrape_with_browser()
+
+    if iqama_times is None:
+        iqama_times = {}
+
+    if not iqama_times:
+        log.warning("⚠️  No iqama times found! Falling back to manual times if available.")
+
+    return iqama_times
+
+
+def _scrape_static_html():
+    """
+    Parse iqama times out of the server-rendered slides HTML.
+    Returns {} when the site is unreachable, and None when a browser might still
+    succeed: the page has no prayer cards (i.e. it is rendered client-side), the
+    server rejected the request, or selectolax isn't installed.
+    """
+    log.info(f"🔍 Parsing iqama times from {MASJID_URL}")
+    iqama_times = {}
+
+    try:
+        from selectolax.parser import HTMLParser
+    except ImportError:
+        log.warning("⚠️  selectolax not installed, can't parse the slides HTML")
+        return None
+
+    try:
+        resp = SESSION.get(MASJID_URL, timeout=10)
+        resp.raise_for_status()
+        tree = HTMLParser(resp.text)
+    except (requests.ConnectionError, requests.Timeout) as e:
+        # The site is unreachable — a browser wouldn't get any further
+        log.error(f"❌ Fetching slides page failed: {e}")
+        return iqama_times
+    except Exception as e:
+        # e.g. a 403/429/503 from bot protection, which a real browser may get past
+        log.error(f"❌ Fetching slides page failed: {e}")
+        return None
+
+    labels = tree.css("[class*='font-bold'][class*='text-3vvh']")
+    if not labels:
+        return None
+
+    for label in labels:
+        prayer_name = label.text(strip=True)
+        if prayer_name not in _PRAYER_SET:
+            log.info(f"  Skipping non-fard: {prayer_name}")
+            continue
+
+        card = label.parent
+        while card is not None and "w-12vvw" not in (card.attributes.get("class") or ""):
+            card = card.parent
+        if card is None:
+            card = label.parent.parent
+
+        iqama_label = card.css_first("[class*='font-bold'][class*='text-2vvh']")
+        iqama_time_el = iqama_label.next if iqama_label else None
+        while iqama_time_el is not None and iqama_time_el.tag == "-text":
+            iqama_time_el = iqama_time_el.next
+        if iqama_time_el is None:
+            log.warning(f"  ⚠️  No iqama time element found for {prayer_name}")
+            continue
+
+        _record_iqama(iqama_times, prayer_name, iqama_time_el.text(strip=True))
+
+    return iqama_times
+
+
+# Requests the fallback browser never needs to read the iqama times
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet", "beacon", "csp_report", "imageset"}
+BLOCKED_URL_PARTS = ("google-analytics", "doubleclick", "googletagmanager", "facebook")
+
+# Keep the headless Chromium as light as possible
+CHROMIUM_ARGS = [
+    "--disable-gpu",
+    "--no-zygote",
+    "--single-process",
+    "--disable-features=AudioServiceOutOfProcess",
+    "--disk-cache-size=1",
+]
+
+
+# Pulls {prayer name: raw iqama text} out of the slide cards in one round trip,
+# keeping only the prayer names passed in
+_EXTRACT_IQAMA_JS = """
+(names) => {
+  const keep = new Set(names);
+  const out = {};
+  document.querySelectorAll("[class*='font-bold'][class*='text-3vvh']").forEach(lbl => {
+    const name = lbl.textContent.trim();
+    if (!keep.has(name)) return;
+    const card = lbl.closest("[class*='w-12vvw']") || lbl.parentElement.parentElement;
+    const iq = card.querySelector("[class*='font-bold'][class*='text-2vvh']");
+    if (iq && iq.nextElementSibling) out[name] = iq.nextElementSibling.textContent.trim();
+  });
+  return out;
+}
+"""
+
+
+def _block_unneeded(route):
+    """Abort images, fonts, media, stylesheets and trackers; let everything else through."""
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES or any(
+        part in request.url for part in BLOCKED_URL_PARTS
+    ):
+        route.abort()
+    else:
+        route.continue_()
+
+
+def _scrape_with_browser():
+    """Render the slides page in headless Chromium and read iqama times from the DOM."""
     log.info(f"🔍 Scraping iqama times from {MASJID_URL}")
     iqama_times = {}
 
     try:
+        from playwright.sync_api import sync_playwright
+
         with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
+            browser = p.chromium.launch(headless=True, args=CHROMIUM_ARGS)
             page = browser.new_page()
+            page.route("**/*", _block_unneeded)
             page.goto(MASJID_URL, wait_until="domcontentloaded", timeout=30000)
-            page.wait_for_timeout(10000)
-
-            prayer_labels = page.query_selector_all("[class*='font-bold'][class*='text-3vvh']")
-
-            for label in prayer_labels:
-                prayer_name = label.inner_text().strip()
-
-                if prayer_name not in PRAYER_NAMES:
-                    log.info(f"  Skipping non-fard: {prayer_name}")
-                    continue
-
-                card = label.evaluate_handle(
-                    "el => el.closest('[class*=\"w-12vvw\"]') || el.parentElement.parentElement"
-                )
-
-                iqama_label = card.as_element().query_selector(
-                    "[class*='font-bold'][class*='text-2vvh']"
-                )
-                if not iqama_label:
-                    log.warning(f"  ⚠️  No iqama label found for {prayer_name}")
-                    continue
-
-                iqama_time_el = iqama_label.evaluate_handle("el => el.nextElementSibling")
-                if not iqama_time_el:
-                    log.warning(f"  ⚠️  No iqama time element found for {prayer_name}")
-                    continue
-
-                raw_time = iqama_time_el.as_element().inner_text().strip()
-                converted = convert_to_24h(raw_time)
-                if converted:
-                    iqama_times[prayer_name] = converted
-                    log.info(f"  Found {prayer_name} iqama: {raw_time} → {converted}")
-                else:
-                    log.warning(f"  ⚠️  Could not parse time for {prayer_name}: {raw_time}")
+            page.wait_for_selector("[class*='text-2vvh']", timeout=30000)
+
+            # Dhuhr is dropped on Fridays anyway — Jumu'ah override handles it
+            names = list(PRAYER_NAMES)
+            if datetime.now(TIMEZONE).weekday() == 4:
+                names = [n for n in PRAYER_NAMES if n != "Dhuhr"]
+
+            raw = page.evaluate(_EXTRACT_IQAMA_JS, names)
+            for prayer_name, raw_time in raw.items():
+                _record_iqama(iqama_times, prayer_name, raw_time)
 
             browser.close()
 
     except Exception as e:
         log.error(f"❌ Scraping failed: {e}")
 
-    if not iqama_times:
-        log.warning("⚠️  No iqama times found! Falling back to manual times if available.")
-
     return iqama_times
 
 
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{2})\s*([AaPp][Mm])")
+_STRIP = str.maketrans("", "", " \n\t\r")
+
+
 def convert_to_24h(time_str):
-    import re
-    time_str = time_str.replace("\n", "").replace(" ", "").strip()
-    match = re.match(r"(\d{1,2}):(\d{2})\s*(AM|PM|am|pm)", time_str)
+    match = _TIME_RE.match(time_str.translate(_STRIP))
     if not match:
         return None
-    h, m, ampm = int(match.group(1)), int(match.group(2)), match.group(3).upper()
-    if ampm == "PM" and h != 12:
-        h += 12
-    elif ampm == "AM" and h == 12:
+    h, m = int(match.group(1)), int(match.group(2))
+    if match.group(3).upper() == "PM":
+        if h != 12:
+            h += 12
+    elif h == 12:
         h = 0
     if 0 <= h <= 23 and 0 <= m <= 59:
         return f"{h:02d}:{m:02d}"
@@ -169,6 +489,7 @@ def convert_to_24h(time_str):
 
 # ── Manual Fallback ──────────────────────────────────────────────────────────
 
+@functools.lru_cache(maxsize=1)
 def get_manual_iqama_times():
     """
     Fallback: manually set iqama times here if scraping doesn't work.
@@ -186,23 +507,60 @@ def get_manual_iqama_times():
 
 # ── Scheduler ────────────────────────────────────────────────────────────────
 
-scheduler = BlockingScheduler(timezone=TIMEZONE)
+# Scene switch and refresh jobs live in SQLite so a restart picks up today's
+# schedule instead of re-scraping; the heartbeat stays in memory
+scheduler = AsyncIOScheduler(
+    jobstores={
+        "default": SQLAlchemyJobStore(url=f"sqlite:///{os.path.join(DATA_DIR, 'jobs.sqlite')}"),
+        "memory": MemoryJobStore(),
+    },
+    job_defaults={"misfire_grace_time": 120, "coalesce": True},
+    timezone=TIMEZONE,
+)
+
+# Records the date (and manual times) of the last successful schedule_today run,
+# so a restart only trusts the persisted jobs if they were built today
+SCHEDULE_MARKER = os.path.join(DATA_DIR, "last_schedule")
+
+# IDs of the one-off scene switch jobs added by schedule_today
+_PRAYER_JOB_IDS: set[str] = set()
+
+
+# Signature and date of the iqama times the current jobs were built from
+_LAST_SIG: bytes | None = None
+_LAST_DATE = None
+
 
+def _schedule_marker(today):
+    manual_sig = hashlib.blake2b(repr(sorted(get_manual_iqama_times().items())).encode()).hexdigest()
+    return f"{today.isoformat()} {manual_sig}"
 
-def schedule_today():
+
+def _schedule_is_current(today):
+    try:
+        with open(SCHEDULE_MARKER, encoding="utf-8") as f:
+            return f.read().strip() == _schedule_marker(today)
+    except OSError:
+        return False
+
+
+def _add(job_id, fn, when, args=()):
+    # Iqama times are minute-resolution; keep run dates on the minute boundary
+    when = when.replace(second=0, microsecond=0)
+    scheduler.add_job(fn, "date", run_date=when, args=args, id=job_id, replace_existing=True)
+    _PRAYER_JOB_IDS.add(job_id)
+
+
+async def schedule_today():
     """Fetch iqama times and schedule scene switches for today."""
+    global _LAST_SIG, _LAST_DATE
     today = datetime.now(TIMEZONE).date()
     is_friday = today.weekday() == 4  # Monday=0, Friday=4
     day_label = "Friday/Jumuah" if is_friday else today.strftime("%A")
     log.info(f"📅 Scheduling for {today} ({day_label})")
 
-    # Remove any previously scheduled prayer jobs
-    for job in scheduler.get_jobs():
-        if job.id.startswith("prayer_") or job.id.startswith("jumuah_"):
-            job.remove()
-
     # Get iqama times (try scraping first, fall back to manual)
-    iqama_times = scrape_iqama_times()
+    iqama_times = await asyncio.to_thread(scrape_iqama_times)
     manual_times = get_manual_iqama_times()
 
     # Merge: scraped times take priority, manual fills gaps
@@ -215,11 +573,25 @@ def schedule_today():
         log.error("❌ No iqama times available! Cannot schedule switches.")
         return
 
+    sig = hashlib.blake2b(repr(sorted(iqama_times.items())).encode()).digest()
+    if sig == _LAST_SIG and today == _LAST_DATE:
+        log.info("✅ Iqama times unchanged, skipping reschedule\n")
+        return
+
+    # Remove any previously scheduled prayer jobs
+    for jid in _PRAYER_JOB_IDS:
+        try:
+            scheduler.remove_job(jid)
+        except JobLookupError:
+            pass  # already fired
+    _PRAYER_JOB_IDS.clear()
+
     now = datetime.now(TIMEZONE)
+    y, mo, d = today.year, today.month, today.day
 
     for prayer, time_str in iqama_times.items():
         h, m = map(int, time_str.split(":"))
-        prayer_dt = datetime.combine(today, datetime.min.time().replace(hour=h, minute=m), tzinfo=TIMEZONE)
+        prayer_dt = datetime(y, mo, d, h, m, tzinfo=TIMEZONE)
         back_dt = prayer_dt + timedelta(minutes=PRAYER_DURATION_MINUTES)
 
         # On Friday, skip Dhuhr — Jumu'ah override handles it
@@ -229,20 +601,7 @@ def schedule_today():
 
         # Only schedule if the time hasn't passed yet
         if prayer_dt > now:
-            scheduler.add_job(
-                switch_to_prayer,
-                "date",
-                run_date=prayer_dt,
-                id=f"prayer_start_{prayer}",
-                replace_existing=True,
-            )
-            scheduler.add_job(
-                switch_to_default,
-                "date",
-                run_date=back_dt,
-                id=f"prayer_end_{prayer}",
-                replace_existing=True,
-            )
+            _add(f"prayer_{prayer}", prayer_window, prayer_dt, args=[PRAYER_DURATION_MINUTES])
             log.info(f"  🕐 {prayer}: camera ON at {time_str}, OFF at {back_dt.strftime('%H:%M')}")
         else:
             log.info(f"  ⏭️  {prayer} at {time_str} already passed, skipping")
@@ -250,46 +609,47 @@ def schedule_today():
     # Friday Jumu'ah override
     if is_friday:
         jh, jm = map(int, JUMUAH_START.split(":"))
-        jumuah_start_dt = datetime.combine(today, datetime.min.time().replace(hour=jh, minute=jm), tzinfo=TIMEZONE)
+        jumuah_start_dt = datetime(y, mo, d, jh, jm, tzinfo=TIMEZONE)
         jh2, jm2 = map(int, JUMUAH_END.split(":"))
-        jumuah_end_dt = datetime.combine(today, datetime.min.time().replace(hour=jh2, minute=jm2), tzinfo=TIMEZONE)
+        jumuah_end_dt = datetime(y, mo, d, jh2, jm2, tzinfo=TIMEZONE)
 
         if jumuah_start_dt > now:
-            scheduler.add_job(
-                switch_to_prayer,
-                "date",
-                run_date=jumuah_start_dt,
-                id="jumuah_start",
-                replace_existing=True,
-            )
-            scheduler.add_job(
-                switch_to_default,
-                "date",
-                run_date=jumuah_end_dt,
-                id="jumuah_end",
-                replace_existing=True,
-            )
+            jumuah_minutes = int((jumuah_end_dt - jumuah_start_dt).total_seconds() // 60)
+            _add("jumuah", prayer_window, jumuah_start_dt, args=[jumuah_minutes])
             log.info(f"  🕌 Jumu'ah: camera ON at {JUMUAH_START}, OFF at {JUMUAH_END}")
 
+    _LAST_SIG, _LAST_DATE = sig, today
+    try:
+        with open(SCHEDULE_MARKER, "w", encoding="utf-8") as f:
+            f.write(_schedule_marker(today))
+    except OSError as e:
+        log.warning(f"⚠️  Could not record schedule date: {e}")
+
     # Make sure we're on the default scene now
-    switch_to_default()
+    await switch_to_default()
 
     log.info("✅ Today's schedule is set!\n")
 
 
 # ── Main ─────────────────────────────────────────────────────────────────────
 
-def main():
-    log.info("=" * 60)
-    log.info("  OBS Prayer Time Auto-Switcher")
-    log.info("=" * 60)
-    log.info(f"  Default scene : {SCENE_DEFAULT}")
-    log.info(f"  Prayer scene  : {SCENE_PRAYER}")
-    log.info(f"  Duration      : {PRAYER_DURATION_MINUTES} min")
-    log.info(f"  Jumu'ah       : {JUMUAH_START} - {JUMUAH_END}")
-    log.info(f"  OBS           : {OBS_HOST}:{OBS_PORT}")
-    log.info(f"  Timezone      : {TIMEZONE}")
-    log.info("=" * 60 + "\n")
+async def async_main():
+    # Load persisted jobs without running anything yet
+    scheduler.start(paused=True)
+
+    # The stored jobs are only reused if the last successful schedule_today ran
+    # today with the same manual times, and neither refresh came due while we
+    # were down. The refresh check happens before the cron jobs are re-added
+    # below, since replace_existing would otherwise swallow a missed run.
+    now = datetime.now(TIMEZONE)
+    refreshes = (scheduler.get_job("daily_refresh"), scheduler.get_job("midday_refresh"))
+    needs_schedule = not _schedule_is_current(now.date()) or any(
+        job is None or job.next_run_time <= now for job in refreshes
+    )
+    if not needs_schedule:
+        _PRAYER_JOB_IDS.update(
+            job.id for job in scheduler.get_jobs() if job.id.startswith(("prayer_", "jumuah"))
+        )
 
     # Schedule the daily refresh at 12:05 AM
     scheduler.add_job(
@@ -311,30 +671,78 @@ def main():
         replace_existing=True,
     )
 
-    # Run immediately on startup
-    schedule_today()
+    # Keep the persistent OBS connection honest
+    scheduler.add_job(
+        obs_heartbeat,
+        "interval",
+        seconds=OBS_HEARTBEAT_SECONDS,
+        id="obs_heartbeat",
+        jobstore="memory",
+        replace_existing=True,
+    )
+
+    scheduler.resume()
+    try:
+        if needs_schedule:
+            # Run immediately on startup
+            await schedule_today()
+        else:
+            log.info(f"♻️  Restored today's schedule ({len(_PRAYER_JOB_IDS)} pending switches)")
+            await switch_to_default()
+
+        log.info("🚀 Scheduler running. Press Ctrl+C to stop.\n")
+        await asyncio.Event().wait()
+    finally:
+        scheduler.shutdown(wait=False)
+        with _OBS_LOCK:
+            _drop_obs_client()
 
-    log.info("🚀 Scheduler running. Press Ctrl+C to stop.\n")
+
+def main():
+    log.info("=" * 60)
+    log.info("  OBS Prayer Time Auto-Switcher")
+    log.info("=" * 60)
+    log.info(f"  Default scene : {SCENE_DEFAULT}")
+    log.info(f"  Prayer scene  : {SCENE_PRAYER}")
+    log.info(f"  Duration      : {PRAYER_DURATION_MINUTES} min")
+    log.info(f"  Jumu'ah       : {JUMUAH_START} - {JUMUAH_END}")
+    log.info(f"  OBS           : {OBS_HOST}:{OBS_PORT}")
+    log.info(f"  Timezone      : {TIMEZONE}")
+    log.info("=" * 60 + "\n")
 
     try:
-        scheduler.start()
+        asyncio.run(async_main())
     except (KeyboardInterrupt, SystemExit):
         log.info("🛑 Shutting down...")
-        scheduler.shutdown()
+    except Exception:
+        log.exception("❌ Crashed")
+        raise
+    finally:
+        # Drain queued records before the listener's daemon thread dies with us
+        log_listener.stop()
+
+
+def _countdown(seconds: int, verbose: bool):
+    if not verbose:
+        time.sleep(seconds)
+        return
+    for i in range(seconds, 0, -1):
+        log.info(f"  {i}...")
+        time.sleep(1)
 
 
 if __name__ == "__main__":
     if len(sys.argv) > 1 and sys.argv[1] == "test":
-        log.info("🧪 TEST MODE — switching in 10 seconds...")
-        for i in range(10, 0, -1):
-            log.info(f"  {i}...")
-            time.sleep(1)
-        switch_to_prayer()
-        log.info("⏳ Switching back in 10 seconds...")
-        for i in range(10, 0, -1):
-            log.info(f"  {i}...")
-            time.sleep(1)
-        switch_to_default()
-        log.info("✅ Test complete!")
+        verbose = "--verbose" in sys.argv[2:]
+        try:
+            log.info("🧪 TEST MODE — switching in 10 seconds...")
+            _countdown(10, verbose)
+            asyncio.run(switch_to_prayer())
+            log.info("⏳ Switching back in 10 seconds...")
+            _countdown(10, verbose)
+            asyncio.run(switch_to_default())
+            log.info("✅ Test complete!")
+        finally:
+            log_listener.stop()
     else:
-        main()
\ No newline at end of file
+        main()